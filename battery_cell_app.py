@@ -1,10 +1,47 @@
 import streamlit as st
-import random
 import json
+import re
+from collections import Counter
+import numpy as np
 import pandas as pd
 from datetime import datetime
-import plotly.express as px
-import plotly.graph_objects as go
+from cell_kernels import cell_stats
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+# CC/CP value: a number followed by A (Amperes) or W (Watts)
+CC_CP_PATTERN = re.compile(r'^\s*([+-]?(?:\d+(?:\.\d*)?|\.\d+))\s*([AW])\s*$', re.IGNORECASE)
+
+# Numeric cell attributes, stored as parallel float32 arrays
+CELL_NUMERIC_FIELDS = ("voltage", "current", "temperature", "capacity", "min_voltage", "max_voltage")
+
+# st.cache_data is shared by every session, so bound the snapshot-keyed caches
+SNAPSHOT_CACHE_ENTRIES = 32
+
+# Display settings for the cells table and charts, kept together in one place
+# (Streamlit re-executes the script on every rerun, so these are still rebuilt each time)
+CELLS_COLUMN_CONFIG = {
+    "voltage": st.column_config.NumberColumn("Voltage (V)", format="%.2f V"),
+    "current": st.column_config.NumberColumn("Current (A)", format="%.2f A"),
+    "temperature": st.column_config.NumberColumn("Temperature (°C)", format="%.1f °C"),
+    "capacity": st.column_config.NumberColumn("Capacity", format="%.2f"),
+    "min_voltage": st.column_config.NumberColumn("Min V", format="%.2f V"),
+    "max_voltage": st.column_config.NumberColumn("Max V", format="%.2f V"),
+}
+TEMPERATURE_CHART_LAYOUT = {
+    "title": "Cell Temperature Distribution",
+    "xaxis_title": "Cell ID",
+    "yaxis_title": "Temperature (°C)"
+}
+VOLTAGE_OVERVIEW_LAYOUT = {
+    "title": "Cell Voltage Overview",
+    "xaxis_title": "Cells",
+    "yaxis_title": "Voltage (V)",
+    "hovermode": "x unified"
+}
 
 # Configure page
 st.set_page_config(
@@ -14,13 +51,23 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def empty_cells():
+    """Create an empty cell store: one list/array per attribute, indexed by position"""
+    cells = {"id": [], "cell_type": []}
+    cells.update({field: np.empty(0, dtype=np.float32) for field in CELL_NUMERIC_FIELDS})
+    return cells
+
 # Initialize session state
-if 'cells_data' not in st.session_state:
-    st.session_state.cells_data = {}
+if 'cells' not in st.session_state:
+    st.session_state.cells = empty_cells()
 if 'tasks_data' not in st.session_state:
     st.session_state.tasks_data = {}
+if 'cell_counter' not in st.session_state:
+    st.session_state.cell_counter = 0
 if 'task_counter' not in st.session_state:
     st.session_state.task_counter = 0
+if 'export_requests' not in st.session_state:
+    st.session_state.export_requests = set()
 
 def get_cell_parameters(cell_type):
     """Get default parameters for different cell types"""
@@ -41,36 +88,189 @@ def calculate_capacity(voltage, current):
     """Calculate capacity based on voltage and current"""
     return round(voltage * current, 2)
 
+def append_cells(cells, cell_ids, cell_type, values):
+    """Append a batch of cells; values maps each numeric field to a scalar or per-cell array"""
+    cells["id"].extend(cell_ids)
+    cells["cell_type"].extend([cell_type] * len(cell_ids))
+    for field in CELL_NUMERIC_FIELDS:
+        new_values = np.broadcast_to(np.asarray(values[field], dtype=np.float32), (len(cell_ids),))
+        cells[field] = np.concatenate((cells[field], new_values))
+
+@st.cache_data(show_spinner=False, max_entries=SNAPSHOT_CACHE_ENTRIES)
+def cells_to_records(cells):
+    """Convert the cell store to a {cell_id: {attribute: value}} dict"""
+    columns = {"cell_type": cells["cell_type"]}
+    # str() of a float32 is its shortest round-trip repr, so 3.2 exports as 3.2
+    # (not 3.200000047683716) and 1.234 keeps all its digits, matching the CSV export
+    columns.update({
+        field: [float(str(value)) for value in cells[field]]
+        for field in CELL_NUMERIC_FIELDS
+    })
+    return {
+        cell_id: {field: values[i] for field, values in columns.items()}
+        for i, cell_id in enumerate(cells["id"])
+    }
+
 def validate_cc_cp_input(input_str):
-    """Validate CC/CP input format (e.g., '5A' or '10W')"""
+    """Validate CC/CP input format (e.g., '5A' or '10W').
+    
+    Returns (is_valid, message, parsed) where parsed is (value, unit) on success.
+    """
     if not input_str:
-        return False, "Input cannot be empty"
+        return False, "Input cannot be empty", None
     
-    input_str = input_str.strip().upper()
-    if input_str.endswith('A') or input_str.endswith('W'):
-        try:
-            float(input_str[:-1])
-            return True, "Valid format"
-        except ValueError:
-            return False, "Invalid number format"
-    else:
-        return False, "Must end with 'A' (Amperes) or 'W' (Watts)"
+    match = CC_CP_PATTERN.match(input_str)
+    if match:
+        return True, "Valid format", (float(match.group(1)), match.group(2).upper())
+    if input_str.rstrip()[-1:].upper() in ('A', 'W'):
+        return False, "Invalid number format", None
+    return False, "Must end with 'A' (Amperes) or 'W' (Watts)", None
 
 def reset_all_data():
     """Reset all session state data"""
-    st.session_state.cells_data = {}
+    st.session_state.cells = empty_cells()
     st.session_state.tasks_data = {}
+    st.session_state.cell_counter = 0
     st.session_state.task_counter = 0
+    st.session_state.export_requests = set()
     st.success("All data has been reset!")
 
-def export_data():
-    """Export all data as JSON"""
+def dumps_json(data):
+    """Serialize data to indented JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode()
+
+def export_data(cells, tasks_data):
+    """Export all data as JSON bytes"""
     export_data = {
         "timestamp": datetime.now().isoformat(),
-        "cells": st.session_state.cells_data,
-        "tasks": st.session_state.tasks_data
+        "cells": cells_to_records(cells),
+        "tasks": tasks_data
     }
-    return json.dumps(export_data, indent=2)
+    return dumps_json(export_data)
+
+def request_export(source):
+    """Show the JSON download button for the given export source"""
+    st.session_state.export_requests.add(source)
+
+def clear_export(source):
+    """Hide the JSON download button once the file has been downloaded"""
+    st.session_state.export_requests.discard(source)
+
+def json_download_button(source, label):
+    """Render the JSON download button if an export was requested from source"""
+    if source in st.session_state.export_requests:
+        st.download_button(
+            label=label,
+            data=export_data(st.session_state.cells, st.session_state.tasks_data),
+            file_name=f"battery_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            key=f"download_json_{source}",
+            on_click=clear_export,
+            args=(source,)
+        )
+
+@st.cache_resource(show_spinner=False)
+def plotly_express():
+    """Import plotly.express on first use (kept out of cold start)"""
+    import plotly.express as px
+    return px
+
+@st.cache_resource(show_spinner=False)
+def plotly_graph_objects():
+    """Import plotly.graph_objects on first use (kept out of cold start)"""
+    import plotly.graph_objects as go
+    return go
+
+@st.cache_data(show_spinner=False, max_entries=SNAPSHOT_CACHE_ENTRIES)
+def cell_type_pie(cell_types):
+    """Build the cell type distribution pie chart (cached per cell type tuple)"""
+    type_counts = Counter(cell_types)
+    return plotly_express().pie(
+        values=list(type_counts.values()),
+        names=list(type_counts.keys()),
+        title="Cell Type Distribution"
+    )
+
+@st.cache_data(show_spinner=False, max_entries=SNAPSHOT_CACHE_ENTRIES)
+def task_timeline(task_keys, durations, task_types):
+    """Build the task Gantt chart (cached per task keys, durations and types)"""
+    # int64: durations have no upper bound and the running total must not wrap
+    durations = np.asarray(durations, dtype=np.int64)
+    end_times = np.cumsum(durations)
+    timeline_df = pd.DataFrame({
+        'Task': task_keys,
+        'Start': end_times - durations,
+        'Finish': end_times,
+        'Type': task_types
+    })
+    return plotly_express().timeline(
+        timeline_df,
+        x_start="Start",
+        x_end="Finish",
+        y="Task",
+        color="Type",
+        title="Task Execution Timeline"
+    )
+
+def cells_to_df(cells):
+    """Build the cells DataFrame from the cell arrays"""
+    columns = {"cell_type": cells["cell_type"]}
+    columns.update({field: cells[field] for field in CELL_NUMERIC_FIELDS})
+    return pd.DataFrame(columns, index=pd.Index(cells["id"], name='Cell ID'))
+
+@st.cache_data(show_spinner=False, max_entries=SNAPSHOT_CACHE_ENTRIES)
+def cells_csv(cells):
+    """Serialize the cells DataFrame to CSV (cached)"""
+    return cells_to_df(cells).to_csv()
+
+def cell_metrics(cells):
+    """Compute total capacity, average temperature and average voltage"""
+    total_capacity, avg_temp, avg_voltage = cell_stats(cells['capacity'], cells['temperature'], cells['voltage'])
+    return float(total_capacity), float(avg_temp), float(avg_voltage)
+
+def cell_type_chart():
+    """Cell type distribution pie chart"""
+    fig = cell_type_pie(tuple(st.session_state.cells["cell_type"]))
+    st.plotly_chart(fig, use_container_width=True)
+
+def temperature_chart():
+    """Per-cell temperature bar chart"""
+    go = plotly_graph_objects()
+    fig = go.Figure(go.Bar(
+        x=st.session_state.cells["id"],
+        y=st.session_state.cells["temperature"]
+    ))
+    fig.update_layout(**TEMPERATURE_CHART_LAYOUT)
+    st.plotly_chart(fig, use_container_width=True)
+
+def task_timeline_chart():
+    """Gantt chart of the tasks, run back to back"""
+    task_keys, durations, task_types = [], [], []
+    for task_key, task_data in st.session_state.tasks_data.items():
+        task_keys.append(task_key)
+        durations.append(task_data['time_seconds'])
+        task_types.append(task_data['task_type'])
+    fig = task_timeline(tuple(task_keys), tuple(durations), tuple(task_types))
+    st.plotly_chart(fig, use_container_width=True)
+
+def voltage_overview_chart():
+    """Cell voltage overview for the combined dashboard"""
+    go = plotly_graph_objects()
+    fig = go.Figure()
+    
+    # Add cell voltages
+    fig.add_trace(go.Scattergl(
+        name='Cell Voltages',
+        x=st.session_state.cells["id"],
+        y=st.session_state.cells["voltage"],
+        mode='markers'
+    ))
+    
+    fig.update_layout(**VOLTAGE_OVERVIEW_LAYOUT)
+    
+    st.plotly_chart(fig, use_container_width=True)
 
 # Main app title
 st.title("🔋 Battery Cell Management System")
@@ -94,20 +294,15 @@ with st.sidebar:
             reset_all_data()
     
     with col2:
-        if st.button("📥 Export JSON", type="primary"):
-            export_json = export_data()
-            st.download_button(
-                label="💾 Download",
-                data=export_json,
-                file_name=f"battery_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                mime="application/json"
-            )
+        st.button("📥 Export JSON", type="primary", on_click=request_export, args=("sidebar",))
+        # Filled in at the end of the script so the export includes this run's additions
+        sidebar_download_container = st.container()
     
     # Display summary stats
     st.markdown("---")
     st.header("📈 Summary")
-    st.metric("Total Cells", len(st.session_state.cells_data))
-    st.metric("Total Tasks", len(st.session_state.tasks_data))
+    # Filled in at the end of the script, after the forms have updated the data
+    summary_container = st.container()
 
 # Main content area with tabs
 tab1, tab2, tab3 = st.tabs(["🔋 Cell Configuration", "⚙️ Task Management", "📊 Data Overview"])
@@ -159,73 +354,52 @@ with tab1:
             submitted = st.form_submit_button("➕ Add Cells", type="primary")
             
             if submitted:
-                for i in range(num_cells):
-                    cell_id = len(st.session_state.cells_data) + 1
-                    cell_key = f"cell_{cell_id}_{cell_type.lower()}"
-                    
-                    temp = round(random.uniform(25, 40), 1)
-                    capacity = calculate_capacity(voltage, current)
-                    
-                    st.session_state.cells_data[cell_key] = {
-                        "cell_type": cell_type,
+                temps = np.random.uniform(25, 40, size=num_cells).round(1)
+                capacity = calculate_capacity(voltage, current)
+                base_id = st.session_state.cell_counter
+                st.session_state.cell_counter += num_cells
+                
+                append_cells(
+                    st.session_state.cells,
+                    [f"cell_{base_id + i + 1}_{cell_type.lower()}" for i in range(num_cells)],
+                    cell_type,
+                    {
                         "voltage": voltage,
                         "current": current,
-                        "temperature": temp,
+                        "temperature": temps,
                         "capacity": capacity,
                         "min_voltage": min_voltage,
                         "max_voltage": max_voltage
                     }
+                )
                 
                 st.success(f"Added {num_cells} {cell_type} cell(s) successfully!")
-                st.rerun()
     
     with col2:
         # Quick stats
-        if st.session_state.cells_data:
+        if st.session_state.cells["id"]:
             st.subheader("Quick Stats")
             
             # Cell type distribution
-            cell_types = [cell['cell_type'] for cell in st.session_state.cells_data.values()]
-            type_counts = pd.Series(cell_types).value_counts()
-            
-            fig = px.pie(
-                values=type_counts.values,
-                names=type_counts.index,
-                title="Cell Type Distribution"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            cell_type_chart()
     
     # Display existing cells
-    if st.session_state.cells_data:
+    if st.session_state.cells["id"]:
         st.subheader("Current Cells")
         
         # Convert to DataFrame for better display
-        cells_df = pd.DataFrame.from_dict(st.session_state.cells_data, orient='index')
-        cells_df.index.name = 'Cell ID'
+        cells_df = cells_to_df(st.session_state.cells)
         
         # Interactive dataframe
         st.dataframe(
             cells_df,
             use_container_width=True,
-            column_config={
-                "voltage": st.column_config.NumberColumn("Voltage (V)", format="%.2f V"),
-                "current": st.column_config.NumberColumn("Current (A)", format="%.2f A"),
-                "temperature": st.column_config.NumberColumn("Temperature (°C)", format="%.1f °C"),
-                "capacity": st.column_config.NumberColumn("Capacity", format="%.2f"),
-                "min_voltage": st.column_config.NumberColumn("Min V", format="%.2f V"),
-                "max_voltage": st.column_config.NumberColumn("Max V", format="%.2f V"),
-            }
+            column_config=CELLS_COLUMN_CONFIG
         )
         
         # Temperature visualization
         if len(cells_df) > 1:
-            fig = px.bar(
-                x=cells_df.index,
-                y=cells_df['temperature'],
-                title="Cell Temperature Distribution",
-                labels={'x': 'Cell ID', 'y': 'Temperature (°C)'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            temperature_chart()
 
 # Tab 2: Task Management
 with tab2:
@@ -293,7 +467,7 @@ with tab2:
             error_messages = []
             
             if task_type in ["CC_CV", "CC_CD"]:
-                is_valid, msg = validate_cc_cp_input(cc_input)
+                is_valid, msg, cc_cp = validate_cc_cp_input(cc_input)
                 if not is_valid:
                     valid = False
                     error_messages.append(f"CC/CP Input: {msg}")
@@ -310,6 +484,8 @@ with tab2:
                 if task_type == "CC_CV":
                     task_data.update({
                         "cc_cp": cc_input,
+                        "cc_cp_value": cc_cp[0],
+                        "cc_cp_unit": cc_cp[1],
                         "cv_voltage": cv_voltage,
                         "current": current,
                         "capacity": capacity
@@ -317,13 +493,14 @@ with tab2:
                 elif task_type == "CC_CD":
                     task_data.update({
                         "cc_cp": cc_input,
+                        "cc_cp_value": cc_cp[0],
+                        "cc_cp_unit": cc_cp[1],
                         "voltage": voltage,
                         "capacity": capacity
                     })
                 
                 st.session_state.tasks_data[task_key] = task_data
                 st.success(f"Added {task_type} task successfully!")
-                st.rerun()
             else:
                 for error in error_messages:
                     st.error(error)
@@ -337,8 +514,8 @@ with tab2:
                 col1, col2 = st.columns([3, 1])
                 
                 with col1:
-                    # Display task details
-                    st.json(task_data)
+                    # Display task details as plain text rather than the JSON tree widget
+                    st.code(dumps_json(task_data).decode(), language='json')
                 
                 with col2:
                     if st.button(f"🗑️ Delete", key=f"delete_{task_key}"):
@@ -349,47 +526,21 @@ with tab2:
         if len(st.session_state.tasks_data) > 1:
             st.subheader("Task Timeline")
             
-            # Create timeline data
-            timeline_data = []
-            cumulative_time = 0
-            
-            for task_key, task_data in st.session_state.tasks_data.items():
-                start_time = cumulative_time
-                end_time = cumulative_time + task_data['time_seconds']
-                timeline_data.append({
-                    'Task': task_key,
-                    'Start': start_time,
-                    'Finish': end_time,
-                    'Type': task_data['task_type']
-                })
-                cumulative_time = end_time
-            
-            # Create Gantt chart
-            fig = px.timeline(
-                timeline_data,
-                x_start="Start",
-                x_end="Finish",
-                y="Task",
-                color="Type",
-                title="Task Execution Timeline"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            task_timeline_chart()
 
 # Tab 3: Data Overview
 with tab3:
     st.header("Complete Data Overview")
     
-    if st.session_state.cells_data or st.session_state.tasks_data:
+    if st.session_state.cells["id"] or st.session_state.tasks_data:
         col1, col2 = st.columns(2)
         
         with col1:
-            if st.session_state.cells_data:
+            if st.session_state.cells["id"]:
                 st.subheader("🔋 Cells Summary")
                 
                 # Summary metrics
-                total_capacity = sum(cell['capacity'] for cell in st.session_state.cells_data.values())
-                avg_temp = sum(cell['temperature'] for cell in st.session_state.cells_data.values()) / len(st.session_state.cells_data)
-                avg_voltage = sum(cell['voltage'] for cell in st.session_state.cells_data.values()) / len(st.session_state.cells_data)
+                total_capacity, avg_temp, avg_voltage = cell_metrics(st.session_state.cells)
                 
                 metric_col1, metric_col2, metric_col3 = st.columns(3)
                 with metric_col1:
@@ -401,16 +552,19 @@ with tab3:
                 
                 # Detailed cell data
                 with st.expander("📊 Detailed Cell Data"):
-                    st.json(st.session_state.cells_data)
+                    st.json(cells_to_records(st.session_state.cells))
         
         with col2:
             if st.session_state.tasks_data:
                 st.subheader("⚙️ Tasks Summary")
                 
                 # Task metrics
-                total_duration = sum(task['time_seconds'] for task in st.session_state.tasks_data.values())
-                task_types = [task['task_type'] for task in st.session_state.tasks_data.values()]
-                most_common_task = max(set(task_types), key=task_types.count) if task_types else "None"
+                total_duration = 0
+                task_type_counts = Counter()
+                for task in st.session_state.tasks_data.values():
+                    total_duration += task['time_seconds']
+                    task_type_counts[task['task_type']] += 1
+                most_common_task = task_type_counts.most_common(1)[0][0] if task_type_counts else "None"
                 
                 metric_col1, metric_col2 = st.columns(2)
                 with metric_col1:
@@ -423,32 +577,10 @@ with tab3:
                     st.json(st.session_state.tasks_data)
         
         # Combined visualization
-        if st.session_state.cells_data and st.session_state.tasks_data:
+        if st.session_state.cells["id"] and st.session_state.tasks_data:
             st.subheader("🔄 System Overview")
             
-            # Create a combined dashboard
-            fig = go.Figure()
-            
-            # Add cell voltages
-            cell_names = list(st.session_state.cells_data.keys())
-            cell_voltages = [cell['voltage'] for cell in st.session_state.cells_data.values()]
-            
-            fig.add_trace(go.Bar(
-                name='Cell Voltages',
-                x=cell_names,
-                y=cell_voltages,
-                yaxis='y',
-                offsetgroup=1
-            ))
-            
-            fig.update_layout(
-                title='Cell Voltage Overview',
-                xaxis_title='Cells',
-                yaxis_title='Voltage (V)',
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            voltage_overview_chart()
         
         # Export section
         st.subheader("💾 Export Options")
@@ -456,20 +588,13 @@ with tab3:
         export_col1, export_col2, export_col3 = st.columns(3)
         
         with export_col1:
-            if st.button("📄 Export as JSON", type="primary"):
-                export_json = export_data()
-                st.download_button(
-                    label="💾 Download JSON",
-                    data=export_json,
-                    file_name=f"battery_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json"
-                )
+            st.button("📄 Export as JSON", type="primary", on_click=request_export, args=("overview",))
+            json_download_button("overview", "💾 Download JSON")
         
         with export_col2:
             if st.button("📊 Export Cells as CSV"):
-                if st.session_state.cells_data:
-                    cells_df = pd.DataFrame.from_dict(st.session_state.cells_data, orient='index')
-                    csv = cells_df.to_csv()
+                if st.session_state.cells["id"]:
+                    csv = cells_csv(st.session_state.cells)
                     st.download_button(
                         label="💾 Download CSV",
                         data=csv,
@@ -484,7 +609,7 @@ with tab3:
                 
                 # Display submission summary
                 with st.expander("📋 Submission Summary"):
-                    st.write(f"**Cells Submitted:** {len(st.session_state.cells_data)}")
+                    st.write(f"**Cells Submitted:** {len(st.session_state.cells['id'])}")
                     st.write(f"**Tasks Submitted:** {len(st.session_state.tasks_data)}")
                     st.write(f"**Timestamp:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
@@ -519,13 +644,14 @@ with tab3:
             - All data persists during your session
             """)
 
+# Sidebar download button and summary stats
+with sidebar_download_container:
+    json_download_button("sidebar", "💾 Download")
+
+with summary_container:
+    st.metric("Total Cells", len(st.session_state.cells["id"]))
+    st.metric("Total Tasks", len(st.session_state.tasks_data))
+
 # Footer
 st.markdown("---")
-st.markdown(
-    """
-    <div style='text-align: center; color: #666;'>
-        🔋 Battery Cell Management System | Built with Streamlit
-    </div>
-    """,
-    unsafe_allow_html=True
-)
\ No newline at end of file
+st.caption("🔋 Battery Cell Management System | Built with Streamlit")
\ No newline at end of file
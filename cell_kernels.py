@@ -0,0 +1,47 @@
+"""Numeric kernels for the cell summary, optionally compiled with numba.
+
+Kept out of the Streamlit script so the numba dispatcher is built once per
+process instead of on every rerun.
+"""
+import numpy as np
+
+# Below this many cells plain numpy is faster than calling into numba
+NUMBA_MIN_CELLS = 100_000
+
+_compiled_stats = None
+
+def _stats_loop(capacities, temps, voltages):
+    """Single pass over the cell arrays with float64 accumulators"""
+    total_capacity = 0.0
+    temp_sum = 0.0
+    voltage_sum = 0.0
+    for i in range(capacities.shape[0]):
+        total_capacity += np.float64(capacities[i])
+        temp_sum += np.float64(temps[i])
+        voltage_sum += np.float64(voltages[i])
+    count = capacities.shape[0]
+    return total_capacity, temp_sum / count, voltage_sum / count
+
+def _numba_stats():
+    """Compile _stats_loop on first use; returns None when numba is not installed"""
+    global _compiled_stats
+    if _compiled_stats is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _compiled_stats = False
+        else:
+            _compiled_stats = njit(cache=True)(_stats_loop)
+    return _compiled_stats or None
+
+def cell_stats(capacities, temps, voltages):
+    """Total capacity, average temperature and average voltage of the cell arrays"""
+    if capacities.shape[0] >= NUMBA_MIN_CELLS:
+        kernel = _numba_stats()
+        if kernel is not None:
+            return kernel(capacities, temps, voltages)
+    return (
+        capacities.sum(dtype=np.float64),
+        temps.mean(dtype=np.float64),
+        voltages.mean(dtype=np.float64)
+    )